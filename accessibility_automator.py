@@ -1,7 +1,10 @@
 from typing import Union, List, Optional, Iterator
+import functools
 import re
 import threading
-from queue import LifoQueue
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from talon import Module, Context, actions, ui, cron, app, canvas
 from talon.ui import Rect, Point2d
 
@@ -16,18 +19,148 @@ mac_context = Context()
 mac_context.matches = "os: mac"
 
 
+@functools.lru_cache(maxsize=128)
+def exact_match_re(string: str) -> str:
+    return f"^{re.escape(string)}$"
+
+
+def _exact_literal(pattern: Optional[str]) -> Optional[str]:
+    """Extract the literal from a `^...$` exact-match pattern, if it is one.
+
+    Returns None if `pattern` isn't a pure escaped-literal exact match (e.g. as
+    produced by `exact_match_re`).
+
+    """
+    if not pattern or not pattern.startswith("^") or not pattern.endswith("$"):
+        return None
+    body = pattern[1:-1]
+    literal = re.sub(r"\\(.)", r"\1", body)
+    return literal if re.escape(literal) == body else None
+
+
 class Spec:
+    # Specs are read on every node visit in the traversal hot loop - slots
+    # make those attribute reads fixed-offset loads instead of dict lookups.
+    __slots__ = (
+        "name",
+        "class_name",
+        "search_indirect",
+        "case_sensitive",
+        "max_depth",
+        "_name_re",
+        "_class_re",
+        "_name_search",
+        "_class_search",
+        "_name_exact",
+        "_class_exact",
+        "_joint",
+    )
+
     def __init__(
         self,
         name: Optional[str] = None,
         class_name: Optional[str] = None,
         search_indirect: bool = False,
         case_sensitive: bool = False,
+        max_depth: Optional[int] = None,
+        name_exact: Optional[str] = None,
     ):
+        # `name_exact` is sugar for an exact-match name - it takes the string
+        # comparison fast path without the caller building a regexp.
+        if name_exact is not None:
+            assert name is None, "Provide `name` or `name_exact`, not both."
+            name = exact_match_re(name_exact)
         self.name = name
         self.class_name = class_name
         self.search_indirect = search_indirect
         self.case_sensitive = case_sensitive
+        # How many levels of intermediate nodes an indirect search may descend
+        # below this spec before the subtree is cut off. None means unbounded.
+        self.max_depth = max_depth
+        # Precompile the patterns once - these are matched against every node
+        # visited during a traversal, so going through the `re` module (and its
+        # cache lookup) each time adds up.
+        self._name_re = (
+            re.compile(name, 0 if case_sensitive else re.IGNORECASE)
+            if name
+            else None
+        )
+        self._class_re = re.compile(class_name) if class_name else None
+        # `^`-anchored patterns can only ever match at the start, so use
+        # Pattern.match - it bails on the first mismatched character instead
+        # of retrying the pattern at every offset like Pattern.search. A
+        # top-level alternation (e.g. "^a|b") only anchors its first branch,
+        # so any pattern containing | conservatively keeps search.
+        self._name_search = (
+            (
+                self._name_re.match
+                if name.startswith("^") and "|" not in name
+                else self._name_re.search
+            )
+            if self._name_re is not None
+            else None
+        )
+        self._class_search = (
+            (
+                self._class_re.match
+                if class_name.startswith("^") and "|" not in class_name
+                else self._class_re.search
+            )
+            if self._class_re is not None
+            else None
+        )
+        # Fast path for `^...$` exact-match patterns (see `exact_match_re`) - a
+        # plain string comparison is much cheaper than the regex engine.
+        self._name_exact = _exact_literal(name)
+        if self._name_exact is not None and not case_sensitive:
+            self._name_exact = self._name_exact.lower()
+        self._class_exact = _exact_literal(class_name)
+        # When both patterns are set (and neither has a cheaper fast path),
+        # verify them with a single regex over "name\x00class_name" - one
+        # engine call per node instead of two. Anchored patterns can't be
+        # joined like this, since the anchors would apply to the joined
+        # string, and inline flags (`(?...)`) can't be embedded in a group.
+        # Direct specs only: indirect searches visit many nodes the class
+        # check alone rejects, where joining would fetch the name (an IPC
+        # call) for nothing.
+        self._joint = None
+        if (
+            not search_indirect
+            and self._name_re is not None
+            and self._class_re is not None
+            and self._name_exact is None
+            and self._class_exact is None
+            and not any(
+                token in pattern
+                for pattern in (name, class_name)
+                for token in ("^", "$", "(?", "\\A", "\\Z", "\x00")
+            )
+        ):
+            name_part = f"(?:{name})" if case_sensitive else f"(?i:{name})"
+            # The gap uses [\s\S] rather than DOTALL so the flag can't leak
+            # into the user's patterns.
+            try:
+                self._joint = re.compile(
+                    f"{name_part}[^\x00]*\x00[\\s\\S]*(?:{class_name})"
+                )
+            except re.error:
+                # Some construct that doesn't survive embedding - fall back
+                # to the separate matchers.
+                self._joint = None
+
+    def name_matches(self, name: str) -> bool:
+        if self._name_re is None:
+            return True
+        if self._name_exact is not None:
+            return (name if self.case_sensitive else name.lower()) == self._name_exact
+        return self._name_search(name) is not None
+
+    def class_matches(self, class_name: str) -> bool:
+        if self._class_re is None:
+            return True
+        if self._class_exact is not None:
+            return class_name == self._class_exact
+        return self._class_search(class_name) is not None
 
 
 @module.action
@@ -36,6 +169,7 @@ def automator_spec(
     class_name: Optional[str] = None,
     search_indirect: Optional[bool] = False,
     case_sensitive: Optional[bool] = False,
+    max_depth: Optional[int] = None,
 ) -> Spec:
     """Create and return an automation element `Spec` object."""
     return Spec(
@@ -43,30 +177,56 @@ def automator_spec(
         class_name=class_name,
         search_indirect=search_indirect,
         case_sensitive=case_sensitive,
+        max_depth=max_depth,
     )
 
 
+# Specs are effectively immutable once built, so the same instance (and its
+# compiled patterns) can be shared between repeated lookups of one icon.
+@functools.lru_cache(maxsize=64)
 def system_tray_button_spec(name_regexp: str) -> Spec:
     return Spec(
         name=name_regexp,
-        class_name="SystemTray.NormalButton",
+        # The class is a known exact string - matching it exactly rejects
+        # non-tray elements with a plain string compare.
+        class_name=exact_match_re("SystemTray.NormalButton"),
         search_indirect=True,
+        # Tray buttons sit shallow in the taskbar/overflow XAML trees - a cap
+        # keeps the search from crawling pathologically deep subtrees.
+        max_depth=10,
     )
 
 
 class SearchSpecs:
     """Useful predefined search paths."""
 
-    WINDOWS_TASKBAR = [
+    # Tuples, not lists - these are shared constants, and tuples hash cheaply
+    # as cache keys.
+    WINDOWS_TASKBAR = (
         Spec(name="Taskbar", class_name="Shell_TrayWnd"),
-    ]
-    WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON = [
+    )
+    WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON = (
         *WINDOWS_TASKBAR,
         system_tray_button_spec("Show Hidden Icons"),
-    ]
-    WINDOWS_TRAY_ICONS_OVERFLOW = [
-        Spec(class_name="TopLevelWindowForOverflowXamlIsland")
-    ]
+    )
+    WINDOWS_TRAY_ICONS_OVERFLOW = (
+        Spec(class_name="TopLevelWindowForOverflowXamlIsland"),
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _tray_specs(icon_name_regexp: str):
+    """Get the (main tray, overflow tray) spec paths for a tray icon.
+
+    Memoized so repeated lookups of the same icon reuse the same Spec objects
+    (and their compiled patterns).
+
+    """
+    button_spec = system_tray_button_spec(icon_name_regexp)
+    return (
+        (*SearchSpecs.WINDOWS_TASKBAR, button_spec),
+        (*SearchSpecs.WINDOWS_TRAY_ICONS_OVERFLOW, button_spec),
+    )
 
 
 @module.action
@@ -75,35 +235,73 @@ def automator_predefined_specs() -> SearchSpecs:
     return SearchSpecs
 
 
-overlay_text_queue = LifoQueue()
+# A plain list guarded by the existing lock - LifoQueue's internal mutex was
+# redundant on top of it.
+overlay_text_stack: List[str] = []
 overlay_text_lock = threading.Lock()
 DEFAULT_OVERLAY_TEXT = "Automating UI"
 
 
+# Fitted text sizes keyed by (text, canvas width, canvas height). `draw` runs
+# every frame but the text and canvas sizes change rarely, and each
+# measure_text is an FFI call.
+_text_fit_cache = OrderedDict()
+_TEXT_FIT_CACHE_MAX = 64
+
+
+def _fit_text(paint, text: str, rect: Rect):
+    """Get (textsize, text_dims) for `text` shrunk to fit `rect`'s width."""
+    cache_key = (text, int(rect.width), int(rect.height))
+    cached = _text_fit_cache.get(cache_key)
+    if cached is not None:
+        _text_fit_cache.move_to_end(cache_key)
+        return cached
+    paint.textsize = round(min(rect.width, rect.height) / 8)
+    # HACK: Ensure text fits in screen bounds
+    text_dims = paint.measure_text(text)[1]
+    while text_dims.width > rect.width * 0.95 and paint.textsize > 1:
+        paint.textsize -= 1
+        text_dims = paint.measure_text(text)[1]
+    result = (paint.textsize, text_dims)
+    _text_fit_cache[cache_key] = result
+    if len(_text_fit_cache) > _TEXT_FIT_CACHE_MAX:
+        _text_fit_cache.popitem(last=False)
+    return result
+
+
+# By default only a horizontal band around the overlay text is dimmed -
+# filling entire (possibly 4K) screens with a blended rect every frame is the
+# dominant render cost. Set this to dim the whole screen instead.
+OVERLAY_DIM_FULL_SCREEN = False
+
+
 def draw(c: canvas.Canvas):
     TRANSPARENCY = "77"
 
     paint = c.paint
+    with overlay_text_lock:
+        text = overlay_text_stack[-1] if overlay_text_stack else DEFAULT_OVERLAY_TEXT
+        # Also wrap in braces
+        text = f"({text})"
+    paint.textsize, text_dims = _fit_text(paint, text, c.rect)
+
     paint.blendmode = paint.Blend.SRC
     paint.color = "#000000" + TRANSPARENCY
     paint.style = paint.Style.FILL
-    c.draw_rect(c.rect)
+    if OVERLAY_DIM_FULL_SCREEN:
+        c.draw_rect(c.rect)
+    else:
+        band_height = text_dims.height * 2
+        c.draw_rect(
+            Rect(
+                c.rect.x,
+                c.rect.center.y - band_height / 2,
+                c.rect.width,
+                band_height,
+            )
+        )
 
     paint.color = "#FFFFFF" + TRANSPARENCY
-    with overlay_text_lock:
-        text = (
-            DEFAULT_OVERLAY_TEXT
-            if overlay_text_queue.empty()
-            else overlay_text_queue.queue[-1]
-        )
-        # Also wrap in braces
-        text = f"({text})"
-    paint.textsize = round(min(c.rect.width, c.rect.height) / 8)
-    # HACK: Ensure text fits in screen bounds
-    text_dims = paint.measure_text(text)[1]
-    while text_dims.width > c.rect.width * 0.95 and paint.textsize > 1:
-        paint.textsize -= 1
-        text_dims = paint.measure_text(text)[1]
     c.draw_text(
         text,
         c.rect.center.x - text_dims.width / 2,
@@ -115,10 +313,33 @@ def draw(c: canvas.Canvas):
 
 canvases = []
 
+# Older talon versions can't hide a canvas, in which case fall back to
+# closing and rebuilding each time.
+_CANVAS_CAN_HIDE = hasattr(canvas.Canvas, "hide")
+
+# The screen geometry the current canvases were built for - they're only
+# rebuilt when this changes.
+_canvas_screen_rects = None
+
 
 def create_canvases():
-    if not canvases:
-        for screen in ui.screens():
+    global _canvas_screen_rects
+    screens = ui.screens()
+    screen_rects = tuple(tuple(screen.rect) for screen in screens)
+    if canvases and screen_rects != _canvas_screen_rects:
+        # The screen layout changed - the kept canvases are stale.
+        for c in canvases:
+            c.close()
+        canvases.clear()
+    if canvases:
+        # Reuse the hidden canvases from the last automation -
+        # Canvas.from_screen is expensive to redo per automation.
+        for c in canvases:
+            c.register("draw", draw)
+            c.show()
+            c.freeze()
+    else:
+        for screen in screens:
             c = canvas.Canvas.from_screen(screen)
             # HOTFIX: from_screen not working right on Windows
             if app.platform == "windows":
@@ -129,13 +350,18 @@ def create_canvases():
             c.register("draw", draw)
             c.freeze()
             canvases.append(c)
+        _canvas_screen_rects = screen_rects
 
 
 def destroy_canvases():
     for c in canvases:
         c.unregister("draw", draw)
-        c.close()
-    canvases.clear()
+        if _CANVAS_CAN_HIDE:
+            c.hide()
+        else:
+            c.close()
+    if not _CANVAS_CAN_HIDE:
+        canvases.clear()
 
 
 def redraw_canvases():
@@ -154,27 +380,33 @@ class AutomationOverlay:
 
     def __enter__(self):
         global canvas_context_count
-        if isinstance(self.text_override, str):
+        text_changed = isinstance(self.text_override, str)
+        if text_changed:
             with overlay_text_lock:
-                overlay_text_queue.put(self.text_override)
+                overlay_text_stack.append(self.text_override)
         # Count multiple entries into this context so the canvases are only
-        # destroyed when exiting the outermost context.
+        # destroyed when exiting the outermost context. Nested entries only
+        # need a redraw when they actually changed the displayed text.
+        #
+        # (This was previously `redraw_canvases` with no parens, so nested
+        # entries never redrew at all.)
         if canvas_context_count == 0:
             create_canvases()
-        else:
-            redraw_canvases
+        elif text_changed:
+            redraw_canvases()
         canvas_context_count += 1
         return self
 
     def __exit__(self, *_, **__):
         global canvas_context_count
-        if isinstance(self.text_override, str):
+        text_changed = isinstance(self.text_override, str)
+        if text_changed:
             with overlay_text_lock:
-                overlay_text_queue.get()
+                overlay_text_stack.pop()
         canvas_context_count -= 1
         if canvas_context_count == 0:
             destroy_canvases()
-        else:
+        elif text_changed:
             redraw_canvases()
         return False
 
@@ -187,62 +419,219 @@ def automator_overlay(text_override: Optional[str] = None) -> AutomationOverlay:
 
 FINDING_ELEMENT_TEXT = "Searching UI Tree"
 
+# One precompiled pattern scans a window title for every known browser in a
+# single pass.
+_BROWSER_RE = re.compile(r"firefox|chrome|edge|safari|brave", re.IGNORECASE)
+
+
+# Class names that only ever appear under specific shell windows. When the
+# first spec targets one of these, every other window (browser AX trees in
+# particular are huge) can be skipped without traversing it at all.
+_KNOWN_ROOT_CLASSES = {
+    "Shell_TrayWnd": frozenset({"Shell_TrayWnd"}),
+    "TopLevelWindowForOverflowXamlIsland": frozenset(
+        {"TopLevelWindowForOverflowXamlIsland"}
+    ),
+    exact_match_re("SystemTray.NormalButton"): frozenset(
+        {"Shell_TrayWnd", "TopLevelWindowForOverflowXamlIsland"}
+    ),
+}
+
+
+def _filtered_children(element: ui.Element, spec: Spec) -> List[ui.Element]:
+    """Get the children of `element` that could possibly match `spec`.
+
+    UIA can filter children server-side in one round-trip (FindAll with a
+    property condition), but talon's `ui.Element` only exposes the plain
+    `children` property, so the filtering happens client-side. Children that
+    can't match a direct exact-class spec are rejected on a single class_name
+    read, before any of their other properties are fetched.
+
+    """
+    children = element.children
+    if spec.search_indirect or spec._class_exact is None:
+        return children
+    class_exact = spec._class_exact
+    return [child for child in children if child.class_name == class_exact]
+
 
 def automator_find_elements_from_roots(
     root_elements: List[ui.Element], *search_specs: Spec
 ):
     with AutomationOverlay(FINDING_ELEMENT_TEXT):
-        queue = LifoQueue()
-        for element in root_elements:
-            queue.put((element, search_specs))
-
-        while not queue.empty():
-            element, remaining_specs = queue.get()
-            if not remaining_specs:
-                continue
-            spec = remaining_specs[0]
-            name_matches = spec.name is None or re.search(
-                spec.name,
-                element.name,
-                re.NONE if spec.case_sensitive else re.IGNORECASE,
-            )
-            class_matches = spec.class_name is None or re.search(
-                spec.class_name, element.class_name
+        yield from _find_elements_from_roots(root_elements, *search_specs)
+
+
+def _find_elements_from_roots(root_elements: List[ui.Element], *search_specs: Spec):
+    """Core traversal behind `automator_find_elements_from_roots`, no overlay."""
+    # NOTE: Don't bother trying to compile this loop (Cython/Numba/etc.) - the
+    # cost per node is dominated by the cross-process accessibility calls
+    # behind each ui.Element property, which a compiler can't touch. The
+    # Python-side overhead just needs to stay small enough that those calls
+    # remain the bottleneck, hence the local aliases below.
+    if not search_specs:
+        return
+    # With no indirect specs the search depth is bounded by the number of
+    # specs and targets sit close to the roots, so breadth-first reaches
+    # them after visiting fewer nodes. Indirect searches stay depth-first
+    # to bound frontier memory on wide trees. Either way this is a plain
+    # deque, not a LifoQueue - the traversal is single-threaded and
+    # LifoQueue takes a lock on every put/get.
+    breadth_first = all(not spec.search_indirect for spec in search_specs)
+    # Entries hold an index into `search_specs` rather than a sliced tuple
+    # of the remaining specs - slicing would allocate per descent.
+    last_index = len(search_specs) - 1
+    # Seed the frontier in one pass, ordered so the first root is always
+    # processed first: forward for popleft, reversed for pop.
+    roots = list(root_elements)
+    stack = deque(
+        (element, 0, 0)
+        for element in (roots if breadth_first else reversed(roots))
+    )
+    take = stack.popleft if breadth_first else stack.pop
+    push = stack.append
+
+    while stack:
+        # `depth` counts indirect hops below the level where the current
+        # spec started matching - it resets when a spec is consumed.
+        element, spec_index, depth = take()
+        spec = search_specs[spec_index]
+        # Element attributes are cross-process accessibility API calls -
+        # each is fetched at most once per visit, and only if the spec
+        # actually constrains it.
+        if spec._joint is not None:
+            # Only built for direct specs, where the node is expected to
+            # match and both properties are needed anyway.
+            matches = spec._joint.search(
+                element.name + "\x00" + element.class_name
             )
-            if name_matches and class_matches:
-                if len(remaining_specs) == 1:
-                    yield element
-                else:
-                    for child in element.children:
-                        queue.put((child, remaining_specs[1:]))
-            elif spec.search_indirect:
-                # We want to search all intermediate nodes if search_indirect is set
-                # - any unmatching node counts as a potential intermediate.
-                for child in element.children:
-                    queue.put((child, remaining_specs))
+        else:
+            # Check class_name first: it's usually an exact compare that
+            # rejects most nodes, and failing it means the name (another
+            # accessibility round-trip) is never fetched.
+            matches = (
+                spec._class_re is None or spec.class_matches(element.class_name)
+            ) and (spec._name_re is None or spec.name_matches(element.name))
+        if matches:
+            if spec_index == last_index:
+                yield element
+            else:
+                children = _filtered_children(
+                    element, search_specs[spec_index + 1]
+                )
+                # Depth-first pops from the right, so push in reverse to
+                # descend the first child first - first-match callers
+                # discard everything pushed after the match.
+                if not breadth_first:
+                    children = list(reversed(children))
+                for child in children:
+                    push((child, spec_index + 1, 0))
+        elif spec.search_indirect and (
+            spec.max_depth is None or depth < spec.max_depth
+        ):
+            # We want to search all intermediate nodes if search_indirect is set
+            # - any unmatching node counts as a potential intermediate.
+            children = list(reversed(element.children))
+            for child in children:
+                push((child, spec_index, depth + 1))
+
+
+# Scan separate window subtrees concurrently. The accessibility calls release
+# the GIL while they block, so threads overlap their latency - but UI
+# Automation thread-safety varies between backends, so this is off by default.
+PARALLEL_ROOT_SCAN = False
+_PARALLEL_SCAN_MAX_WORKERS = 8
+
+
+def _find_elements_parallel(root_elements: List[ui.Element], search_specs):
+    with AutomationOverlay(FINDING_ELEMENT_TEXT):
+        executor = ThreadPoolExecutor(
+            max_workers=min(_PARALLEL_SCAN_MAX_WORKERS, len(root_elements))
+        )
+        try:
+            futures = [
+                executor.submit(
+                    list, _find_elements_from_roots([root], *search_specs)
+                )
+                for root in root_elements
+            ]
+            # Yield whole subtrees as they finish - result order follows
+            # completion, not window priority.
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            # First-match callers abandon this generator after one yield -
+            # don't make them wait for the remaining subtrees (browsers!) to
+            # finish scanning. Unstarted scans are cancelled; in-flight ones
+            # finish in the background.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Snapshot of the top-level window list. Enumerating windows is IPC-heavy and
+# the list barely changes across back-to-back automation commands, so reuse a
+# recent snapshot rather than re-enumerating.
+_WINDOWS_TTL_SECONDS = 0.5
+_windows_snapshot = ([], 0.0)
+
+
+def _cached_windows():
+    """Get the visible top-level windows, from a recent snapshot if possible.
+
+    talon's `ui.windows()` takes no visibility filter, so hidden and minimized
+    windows are filtered out here - once per snapshot rather than once per
+    caller.
+
+    """
+    global _windows_snapshot
+    windows, timestamp = _windows_snapshot
+    if time.monotonic() - timestamp >= _WINDOWS_TTL_SECONDS:
+        windows = [
+            window
+            for window in ui.windows()
+            if not (window.hidden or window.minimized)
+        ]
+        _windows_snapshot = (windows, time.monotonic())
+    return windows
 
 
 def automator_find_elements(*search_specs: Spec) -> Iterator[ui.Element]:
     """Iterator to yeild all elements matching a particular search spec."""
     with AutomationOverlay(FINDING_ELEMENT_TEXT):
         # TODO: Edge case for if the first spec matches the root node?
+        first_spec = search_specs[0] if search_specs else None
+        known_roots = (
+            _KNOWN_ROOT_CLASSES.get(first_spec.class_name) if first_spec else None
+        )
+        # A direct (non-indirect) first spec with an exact class can only
+        # match a window whose root has exactly that class - everything else
+        # can be skipped without seeding its subtree.
+        root_class = (
+            first_spec._class_exact
+            if first_spec is not None and not first_spec.search_indirect
+            else None
+        )
         windows = []
         browser_windows = []
-        for window in ui.windows():
-            if window.hidden or window.minimized:
-                continue
+        for window in _cached_windows():
             try:
                 element = window.element
             except OSError:
                 continue
-            for browser in {"firefox", "chrome", "edge", "safari", "brave"}:
-                if browser in element.name.lower():
-                    browser_windows.append(element)
+            if known_roots is not None or root_class is not None:
+                el_class = element.class_name
+                if known_roots is not None and el_class not in known_roots:
                     continue
-            windows.append(element)
+                if root_class is not None and el_class != root_class:
+                    continue
+            if _BROWSER_RE.search(element.name):
+                browser_windows.append(element)
+            else:
+                windows.append(element)
         # Browsers can take a long time to scrape, so put them at the end.
         windows.extend(browser_windows)
-        return automator_find_elements_from_roots(reversed(windows), *search_specs)
+        if PARALLEL_ROOT_SCAN and len(windows) > 1:
+            return _find_elements_parallel(windows, search_specs)
+        return automator_find_elements_from_roots(windows, *search_specs)
 
 
 def automator_find_elements_current_window(*search_specs: Spec) -> Iterator[ui.Element]:
@@ -262,71 +651,102 @@ class ElementNotFoundError(RuntimeError):
         super().__init__(message)
 
 
-def _automator_find_first_element_internal(
-    elements_iterator: Iterator[ui.Element],
-) -> ui.Element:
-    """Common functionality. See references."""
+# Results of recent first-element searches, keyed by the spec path. The
+# desktop changes constantly, so entries expire quickly and are validated
+# before being reused.
+_FIND_CACHE_TTL_SECONDS = 2.0
+_find_cache = {}
+
+
+def _spec_cache_key(search_specs):
+    return tuple(
+        (
+            spec.name,
+            spec.class_name,
+            spec.search_indirect,
+            spec.case_sensitive,
+            spec.max_depth,
+        )
+        for spec in search_specs
+    )
+
+
+def _invalidate_find_cache():
+    # The window snapshot is invalidated too - anything that changes the AX
+    # tree may also have opened or closed windows.
+    global _windows_snapshot
+    _find_cache.clear()
+    _windows_snapshot = ([], 0.0)
+
+
+def automator_find_first_element(*search_specs: Spec) -> ui.Element:
+    """Find the first element that matches `search_specs`."""
+    cache_key = _spec_cache_key(search_specs)
+    cached = _find_cache.get(cache_key)
+    if cached:
+        element, expiry = cached
+        if time.monotonic() < expiry:
+            try:
+                # Check the element is still alive before reusing it.
+                element.rect
+                return element
+            except OSError:
+                pass
+        del _find_cache[cache_key]
     try:
-        return next(iter(elements_iterator))
+        element = next(automator_find_elements(*search_specs))
     except StopIteration:
         raise ElementNotFoundError()
+    _find_cache[cache_key] = (element, time.monotonic() + _FIND_CACHE_TTL_SECONDS)
+    return element
 
 
-def automator_find_first_element(*search_specs: Spec) -> ui.Element:
-    """Find the first element that matches `search_specs`."""
-    return _automator_find_first_element_internal(
-        automator_find_elements(*search_specs)
-    )
+def automator_find_first_element_from_roots(
+    root_elements: List[ui.Element], *search_specs: Spec
+) -> ui.Element:
+    """Find the first element below `root_elements` matching `search_specs`.
+
+    Stops the traversal at the first match rather than enumerating every
+    result.
+
+    """
+    for element in automator_find_elements_from_roots(root_elements, *search_specs):
+        return element
+    raise ElementNotFoundError()
 
 
 def automator_find_first_element_current_window(*search_specs: Spec) -> ui.Element:
     """Find the first element that matches `search_specs` in the current window."""
-    return _automator_find_first_element_internal(
-        automator_find_elements_current_window(*search_specs)
+    return automator_find_first_element_from_roots(
+        [ui.current_window().element], *search_specs
     )
 
 
-def click_element(element: ui.Element, button: int = 0):
-    # TODO: Return mouse to original position?
-    actions.mouse_move(*element.clickable_point)
-    actions.mouse_click(button=button)
-
-
-def automator_get_tray_icon(icon_name_regexp: str) -> ui.Element:
-    # Open the start menu to ensure the tray is showing on Windows 11
-    key("win")
-    sleep("300ms")
+def _wait_for_element(
+    search_specs, timeout_ms: int = 500, interval_ms: int = 20
+) -> ui.Element:
+    """Poll until an element matching `search_specs` appears, then return it.
 
-    button_spec = system_tray_button_spec(icon_name_regexp)
+    Returns as soon as the element exists, rather than sleeping a fixed amount
+    and hoping the UI has caught up. Raises `ElementNotFoundError` on timeout.
 
-    # Try to find the icon in the main window first.
-    main_tray_button_specs = [*SearchSpecs.WINDOWS_TASKBAR, button_spec]
-    try:
-        return automator_find_first_element(*main_tray_button_specs)
-    except ElementNotFoundError:
-        pass
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    while True:
+        # We're waiting on the UI changing - don't trust cached state.
+        _invalidate_find_cache()
+        try:
+            return automator_find_first_element(*search_specs)
+        except ElementNotFoundError:
+            if time.monotonic() >= deadline:
+                raise
+        sleep(f"{interval_ms}ms")
 
-    # If it's not in the main window, try finding it in the overflow icons.
-    #
-    # First open the overflow window.
-    hidden_items_button = automator_find_first_element(
-        *SearchSpecs.WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON
-    )
-    click_element(hidden_items_button)
-    sleep("100ms")
 
-    # Once the overflow window is open,
-    overflow_tray_button_spec = [*SearchSpecs.WINDOWS_TRAY_ICONS_OVERFLOW, button_spec]
-    try:
-        return automator_find_first_element(*overflow_tray_button_spec)
-    except ElementNotFoundError:
-        # Close the overflow tray (somewhat convoluted method to do so)
-        key("win")
-        sleep("200ms")
-        click_element(hidden_items_button)
-        sleep("200ms")
-        key("win")
-        raise
+def click_element(element: ui.Element, button: int = 0):
+    # TODO: Return mouse to original position?
+    actions.mouse_move(*element.clickable_point)
+    actions.mouse_click(button=button)
 
 
 @module.action_class
@@ -346,9 +766,12 @@ class Actions:
     ) -> ui.Element:
         """Find the first element matching `search_specs`."""
         with AutomationOverlay():
-            return _automator_find_first_element_internal(
-                actions.self.automator_find_elements(search_specs, root_elements)
-            )
+            try:
+                return next(
+                    actions.self.automator_find_elements(search_specs, root_elements)
+                )
+            except StopIteration:
+                raise ElementNotFoundError()
 
     def automator_click_element(search_specs: List[Spec], button: int = 0):
         """Find and click a specific element."""
@@ -370,6 +793,10 @@ class Actions:
         with AutomationOverlay():
             click_element(element, button=button)
 
+    def automator_invalidate_ax_cache():
+        """Invalidate cached element search results, e.g. after clicking something."""
+        _invalidate_find_cache()
+
     def automator_open_talon_repl():
         """Open the Talon repl from the menu (or switch to it if it's already open)."""
 
@@ -390,57 +817,52 @@ class Actions:
         """Close the start menu in Windows, iff it's open. Does nothing on other platforms."""
         if app.platform == "windows":
             with AutomationOverlay():
-                for window in ui.windows():
+                for window in _cached_windows():
                     if (
-                        not (window.hidden or window.minimized)
-                        and window.title == "Start"
+                        window.title == "Start"
                         and window.app.name == "Windows Start Experience Host"
                     ):
                         print(
                             "[accessibility_automator]: Start menu detected as open. Closing it."
                         )
                         key("win")
+                        _invalidate_find_cache()
                         sleep("500ms")
                         return
 
 
-def exact_match_re(string: str) -> str:
-    return f"^{re.escape(string)}$"
-
-
 def automator_get_tray_icon_windows(icon_name_regexp: str) -> ui.Element:
     # Reset so we have a predictable starting state
     actions.self.automator_close_start_menu()
 
     # Open the start menu to ensure the tray is showing on Windows 11
     key("win")
-    sleep("500ms")
+    # The taskbar's AX tree changes when the start menu opens.
+    _invalidate_find_cache()
 
-    button_spec = system_tray_button_spec(icon_name_regexp)
+    main_tray_button_specs, overflow_tray_button_specs = _tray_specs(icon_name_regexp)
 
     # Try to find the icon in the main window first.
-    main_tray_button_specs = [*SearchSpecs.WINDOWS_TASKBAR, button_spec]
     try:
-        return automator_find_first_element(*main_tray_button_specs)
+        return _wait_for_element(main_tray_button_specs)
     except ElementNotFoundError:
         pass
 
     # If it's not in the main window, try finding it in the overflow icons.
     #
     # First open the overflow window.
-    hidden_items_button = automator_find_first_element(
-        *SearchSpecs.WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON
+    hidden_items_button = _wait_for_element(
+        SearchSpecs.WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON
     )
     click_element(hidden_items_button)
-    sleep("100ms")
 
     # Once the overflow window is open,
-    overflow_tray_button_spec = [*SearchSpecs.WINDOWS_TRAY_ICONS_OVERFLOW, button_spec]
     try:
-        return automator_find_first_element(*overflow_tray_button_spec)
+        return _wait_for_element(overflow_tray_button_specs)
     except ElementNotFoundError:
         # Close the overflow tray (somewhat convoluted method to do so)
         key("win")
+        _invalidate_find_cache()
         sleep("200ms")
         click_element(hidden_items_button)
         sleep("200ms")
@@ -452,23 +874,14 @@ def click_talon_menu_item_windows(*exact_menu_sequence: str):
     assert len(exact_menu_sequence) >= 1, exact_menu_sequence
 
     click_element(automator_get_tray_icon_windows(r"^Talon$"))
-    sleep("100ms")
-
-    # Require exact matches for menu items
-    menu_path = [
-        Spec(name="^Context$"),
-        Spec(name=exact_match_re(exact_menu_sequence[0])),
-    ]
-    click_element(automator_find_first_element(*menu_path))
-    if len(exact_menu_sequence) > 1:
-        sleep("50ms")
-        for i in range(1, len(exact_menu_sequence)):
-            # The submenus appear to be named after the parent's name.
-            subitem_path = [
-                Spec(name=exact_match_re(exact_menu_sequence[i - 1])),
-                Spec(name=exact_match_re(exact_menu_sequence[i])),
-            ]
-            click_element(automator_find_first_element(*subitem_path))
+
+    # Require exact matches for menu items. Build each item's spec once -
+    # consecutive steps reuse the previous item's spec as the parent.
+    item_specs = [Spec(name_exact=item) for item in exact_menu_sequence]
+    click_element(_wait_for_element([Spec(name_exact="Context"), item_specs[0]]))
+    for i in range(1, len(item_specs)):
+        # The submenus appear to be named after the parent's name.
+        click_element(_wait_for_element([item_specs[i - 1], item_specs[i]]))
 
 
 @windows_context.action_class("self")
@@ -499,11 +912,11 @@ class WindowsActions:
             #
             # TODO: Action to open windows menu IFF it's not already open.
             key("win")
-            sleep("300ms")
+            _invalidate_find_cache()
 
             # Open the overflow window.
-            hidden_items_button = automator_find_first_element(
-                *SearchSpecs.WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON
+            hidden_items_button = _wait_for_element(
+                SearchSpecs.WINDOWS_HIDDEN_ITEMS_TRAY_BUTTON
             )
             click_element(hidden_items_button)
             sleep("100ms")